@@ -1,42 +1,64 @@
+import cProfile
+import io
 import logging
+import marshal
 import os
+import pstats
+import random
 import socket
-import sqlite3
 import time
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
 from logging.handlers import RotatingFileHandler
-from threading import Thread
+from threading import Lock, Thread
+from urllib.parse import parse_qs
 
-import bcrypt
 import pytz
 import requests
 from dotenv import load_dotenv
-from flask import Flask, jsonify, render_template, request
-from flask_apscheduler import APScheduler
-from flask_jwt_extended import (JWTManager, create_access_token,
-                                get_jwt_identity, jwt_required)
-from flask_restx import Api, Resource, fields
+from flask import (Blueprint, Flask, Response, current_app, g, jsonify,
+                   render_template, request)
+from flask_jwt_extended import JWTManager
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, or_
 import colorlog
-from werkzeug.serving import WSGIRequestHandler
-from flask.logging import default_handler
+from werkzeug.serving import WSGIRequestHandler, make_server
 
 load_dotenv()
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///adms.db'
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET')
-app.config['SCHEDULER_API_ENABLED'] = True
-
 # Pengaturan zona waktu Jakarta
 JAKARTA_TZ = pytz.timezone('Asia/Jakarta')
-app.config['TIMEZONE'] = JAKARTA_TZ
 
-db = SQLAlchemy(app)
-jwt = JWTManager(app)
-scheduler = APScheduler()
-scheduler.init_app(app)
-scheduler.start()
+# Ekstensi dibuat tanpa app, lalu diikat di create_app()
+db = SQLAlchemy()
+jwt = JWTManager()
+bp = Blueprint('iclock', __name__)
+
+# Konfigurasi default. Semua subsistem latar belakang (scheduler, socket
+# listener, logging ke file/console, replay webhook) non-aktif secara default
+# agar import dan pembuatan app tetap ringan untuk migrate.py, test dan worker.
+DEFAULT_CONFIG = {
+    'SQLALCHEMY_DATABASE_URI': 'sqlite:///adms.db',
+    'SCHEDULER_API_ENABLED': True,
+    'TIMEZONE': JAKARTA_TZ,
+    'ADMS_ENABLE_LOGGING': False,
+    'ADMS_ENABLE_SCHEDULER': False,
+    'ADMS_ENABLE_SOCKET_SERVER': False,
+    'ADMS_REPLAY_WEBHOOKS': False,
+    'ADMS_LOG_FILE': 'logs/app.log',
+    'ADMS_LOG_LEVEL': 'INFO',
+    'ADMS_SOCKET_PORT': 8082,
+    # Profiling request /iclock/* (dapat diubah saat runtime lewat /api/profiler)
+    'ADMS_PROFILER_ENABLED': False,
+    'ADMS_PROFILER_SAMPLE_RATE': 0.1,
+    'ADMS_SLOW_REQUEST_MS': 1000,  # 0 = non-aktif
+    # Replikasi pengguna/sidik jari antar mesin lewat /iclock/getrequest
+    'ADMS_SYNC_ENABLED': True,
+    'ADMS_SYNC_BATCH_SIZE': 50,
+    'ADMS_SYNC_RESEND_SECONDS': 300,
+    'ADMS_SYNC_MAX_ATTEMPTS': 3,
+}
 
 # Setup logging
 log_colors = {
@@ -75,37 +97,64 @@ formatter = PrettyFormatter(
     style='%'
 )
 
-# Pastikan direktori logs ada
-os.makedirs('logs', exist_ok=True)
+# Custom success level
+logging.SUCCESS = 25  # between INFO and WARNING
+logging.addLevelName(logging.SUCCESS, 'SUCCESS')
 
-# Setup handler untuk file
-file_handler = RotatingFileHandler(
-    'logs/app.log',
-    maxBytes=10485760,  # 10MB
-    backupCount=5,
-    encoding='utf-8'
-)
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
+def configure_logging(app):
+    log_file = app.config['ADMS_LOG_FILE']
+    log_level = logging.getLevelName(str(app.config['ADMS_LOG_LEVEL']).upper())
+    if not isinstance(log_level, int):
+        raise ValueError(f"ADMS_LOG_LEVEL tidak valid: {app.config['ADMS_LOG_LEVEL']}")
 
-# Setup handler untuk console
-console_handler = colorlog.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-console_handler.setFormatter(formatter)
+    # Pastikan direktori logs ada
+    os.makedirs(os.path.dirname(log_file) or '.', exist_ok=True)
 
-# Hapus handler yang ada sebelumnya
-for handler in app.logger.handlers[:]:
-    app.logger.removeHandler(handler)
+    # Setup handler untuk file
+    file_handler = RotatingFileHandler(
+        log_file,
+        maxBytes=10485760,  # 10MB
+        backupCount=5,
+        encoding='utf-8'
+    )
+    file_handler.setLevel(log_level)
+    file_handler.setFormatter(formatter)
 
-# Tambahkan handler baru
-app.logger.addHandler(file_handler)
-app.logger.addHandler(console_handler)
-app.logger.setLevel(logging.DEBUG)
+    # Setup handler untuk console
+    console_handler = colorlog.StreamHandler()
+    console_handler.setLevel(log_level)
+    console_handler.setFormatter(formatter)
 
-# Custom success level
-logging.SUCCESS = 25  # between INFO and WARNING
-logging.addLevelName(logging.SUCCESS, 'SUCCESS')
-setattr(app.logger, 'success', lambda message, *args: app.logger.log(logging.SUCCESS, message, *args))
+    # Hapus handler yang ada sebelumnya
+    for handler in app.logger.handlers[:]:
+        app.logger.removeHandler(handler)
+
+    # Tambahkan handler baru
+    app.logger.addHandler(file_handler)
+    app.logger.addHandler(console_handler)
+    app.logger.setLevel(log_level)
+
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET')
+    if config:
+        app.config.update(config)
+
+    if app.config['ADMS_ENABLE_LOGGING']:
+        configure_logging(app)
+    setattr(app.logger, 'success', lambda message, *args: app.logger.log(logging.SUCCESS, message, *args))
+
+    app.extensions['adms_profiler'] = RequestProfiler(
+        enabled=app.config['ADMS_PROFILER_ENABLED'],
+        sample_rate=app.config['ADMS_PROFILER_SAMPLE_RATE'],
+        slow_request_ms=app.config['ADMS_SLOW_REQUEST_MS'],
+    )
+
+    db.init_app(app)
+    jwt.init_app(app)
+    app.register_blueprint(bp)
+    return app
 
 # Models
 class IClockMachine(db.Model):
@@ -149,6 +198,51 @@ class IClockAttendance(db.Model):
     reserved_2 = db.Column(db.String(20))
     iclock_machine_id = db.Column(db.Integer, db.ForeignKey('i_clock_machine.id'))
 
+class IClockOperationLog(db.Model):
+    # Tabel append-only untuk OPLOG. Kolom type/status disimpan sebagai kode
+    # integer dari mesin agar baris tetap kecil dan mudah diindeks.
+    __table_args__ = (
+        db.Index('ix_i_clock_operation_log_machine_date', 'iclock_machine_id', 'date'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    iclock_machine_id = db.Column(db.Integer, db.ForeignKey('i_clock_machine.id'))
+    date = db.Column(db.DateTime, nullable=False, index=True)
+    type = db.Column(db.SmallInteger, nullable=False)
+    status = db.Column(db.SmallInteger)
+    pin = db.Column(db.Integer)
+    value1 = db.Column(db.Integer)
+    value2 = db.Column(db.Integer)
+    value3 = db.Column(db.Integer)
+
+# Jenis perubahan pada IClockSyncChange
+SYNC_KIND_USER = 1
+SYNC_KIND_FINGERPRINT = 2
+
+class IClockSyncChange(db.Model):
+    # Log perubahan append-only; id autoincrement menjadi versi global yang
+    # dipakai sebagai cursor replikasi per mesin dan sebagai ID command.
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.SmallInteger, nullable=False)
+    pin = db.Column(db.Integer, nullable=False)
+    fid = db.Column(db.Integer)
+    iclock_machine_id = db.Column(db.Integer, db.ForeignKey('i_clock_machine.id'))
+
+class IClockMachineSync(db.Model):
+    # acked_version: semua perubahan sampai versi ini sudah dikirim ke mesin;
+    # yang belum berhasil tercatat di IClockSyncCommand
+    iclock_machine_id = db.Column(db.Integer, db.ForeignKey('i_clock_machine.id'), primary_key=True)
+    acked_version = db.Column(db.Integer, nullable=False, default=0)
+    pending_since = db.Column(db.DateTime)
+
+class IClockSyncCommand(db.Model):
+    # Command yang belum dikonfirmasi berhasil oleh mesin. result None berarti
+    # menunggu jawaban; baris dihapus saat mesin menjawab Return=0 dan
+    # dibiarkan (tidak dikirim lagi) setelah gagal ADMS_SYNC_MAX_ATTEMPTS kali.
+    iclock_machine_id = db.Column(db.Integer, db.ForeignKey('i_clock_machine.id'), primary_key=True)
+    change_id = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    result = db.Column(db.Integer)
+
 class AttendanceHook(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     url = db.Column(db.String(255), nullable=False)
@@ -162,113 +256,493 @@ def get_timezone_offset_string(timezone):
 def get_current_jakarta_time():
     return datetime.now(JAKARTA_TZ)
 
+def parse_machine_date(date_string, machine_timezone):
+    machine_date = datetime.strptime(date_string + get_timezone_offset_string(machine_timezone), "%Y-%m-%d %H:%M:%S%z")
+    return machine_date.astimezone(JAKARTA_TZ)
+
+def parse_query_date(value):
+    # Kolom DateTime disimpan sebagai waktu Jakarta tanpa offset, jadi input
+    # dengan zona waktu dikonversi dulu ke waktu Jakarta
+    date = datetime.fromisoformat(value)
+    if date.tzinfo is not None:
+        date = date.astimezone(JAKARTA_TZ).replace(tzinfo=None)
+    return date
+
+def parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+# Profiling
+class RequestProfiler:
+    """Menyimpan hasil cProfile agregat dan catatan request lambat.
+
+    Saat mode profiling mati, biaya per request hanya pengecekan atribut;
+    pengukuran per fase hanya aktif jika ambang request lambat di-set.
+    """
+
+    def __init__(self, enabled=False, sample_rate=0.1, slow_request_ms=1000, max_slow_requests=100):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_request_ms = slow_request_ms
+        self.sampled_requests = 0
+        self.slow_requests = deque(maxlen=max_slow_requests)
+        self._stats = None
+        self._lock = Lock()
+
+    def should_sample(self):
+        return self.enabled and random.random() < self.sample_rate
+
+    def add_profile(self, profile):
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.sampled_requests += 1
+
+    def record_slow_request(self, record):
+        with self._lock:
+            self.slow_requests.append(record)
+
+    def reset(self):
+        with self._lock:
+            self._stats = None
+            self.sampled_requests = 0
+            self.slow_requests.clear()
+
+    def dump_pstats(self):
+        # Format sama dengan pstats.Stats.dump_stats(), bisa dibuka dengan
+        # pstats.Stats('file.prof') atau snakeviz
+        with self._lock:
+            if self._stats is None:
+                return None
+            return marshal.dumps(self._stats.stats)
+
+    def format_stats(self, sort='cumulative', limit=50):
+        with self._lock:
+            if self._stats is None:
+                return None
+            stream = io.StringIO()
+            self._stats.stream = stream
+            self._stats.sort_stats(sort).print_stats(limit)
+            return stream.getvalue()
+
+    def to_dict(self):
+        return {
+            'enabled': self.enabled,
+            'sample_rate': self.sample_rate,
+            'slow_request_ms': self.slow_request_ms,
+            'sampled_requests': self.sampled_requests,
+            'slow_requests': len(self.slow_requests),
+        }
+
+@contextmanager
+def timed_phase(name):
+    """Menambahkan durasi blok ke fase `name` jika request sedang diukur."""
+    phases = g.get('adms_phases')
+    if phases is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+@bp.before_request
+def start_request_profiling():
+    if not request.path.startswith('/iclock/'):
+        return
+    profiler = current_app.extensions['adms_profiler']
+    if profiler.slow_request_ms:
+        g.adms_phases = {}
+        g.adms_request_start = time.perf_counter()
+    if profiler.should_sample():
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Profiler lain sedang aktif (mis. request paralel di Python 3.12+)
+            return
+        g.adms_profile = profile
+
+@bp.teardown_request
+def finish_request_profiling(exc):
+    profile = g.pop('adms_profile', None)
+    if profile is not None:
+        profile.disable()
+        current_app.extensions['adms_profiler'].add_profile(profile)
+
+    phases = g.pop('adms_phases', None)
+    if phases is None:
+        return
+    profiler = current_app.extensions['adms_profiler']
+    duration = time.perf_counter() - g.pop('adms_request_start')
+    duration_ms = duration * 1000
+    if not profiler.slow_request_ms or duration_ms < profiler.slow_request_ms:
+        return
+
+    record = {
+        'timestamp': get_current_jakarta_time().isoformat(),
+        'method': request.method,
+        'path': request.path,
+        'serial_number': request.args.get('SN'),
+        'table': request.args.get('table'),
+        'duration_ms': round(duration_ms, 2),
+        'phases_ms': {name: round(elapsed * 1000, 2) for name, elapsed in phases.items()},
+    }
+    record['phases_ms']['other'] = round((duration - sum(phases.values())) * 1000, 2)
+    profiler.record_slow_request(record)
+    current_app.logger.warning(f"Request lambat: {record}")
+
 # Services
 def handle_machine_heartbeat(serial_number):
     if not serial_number:
-        app.logger.error("Serial number tidak diberikan")
+        with timed_phase('log'):
+            current_app.logger.error("Serial number tidak diberikan")
         return None
     
-    machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
-    if machine:
-        machine.last_seen = get_current_jakarta_time()
-        db.session.commit()
-        app.logger.info(f"Heartbeat diterima dari mesin {serial_number}")
-    else:
-        new_machine = IClockMachine(
-            serial_number=serial_number, 
-            name=f"Mesin {serial_number}",  # Nama default
-            last_seen=get_current_jakarta_time(),
-            timezone=int(os.getenv('DEFAULT_TZ', 7))
-        )
-        db.session.add(new_machine)
-        db.session.commit()
-        app.logger.info(f"Mesin baru {serial_number} ditambahkan")
-        machine = new_machine
+    created = False
+    with timed_phase('db'):
+        machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
+        if machine:
+            machine.last_seen = get_current_jakarta_time()
+            db.session.commit()
+        else:
+            machine = IClockMachine(
+                serial_number=serial_number, 
+                name=f"Mesin {serial_number}",  # Nama default
+                last_seen=get_current_jakarta_time(),
+                timezone=int(os.getenv('DEFAULT_TZ', 7))
+            )
+            db.session.add(machine)
+            db.session.commit()
+            created = True
+    with timed_phase('log'):
+        if created:
+            current_app.logger.info(f"Mesin baru {serial_number} ditambahkan")
+        else:
+            current_app.logger.info(f"Heartbeat diterima dari mesin {serial_number}")
     return machine
 
+def record_sync_change(kind, pin, fid, machine):
+    db.session.add(IClockSyncChange(
+        kind=kind,
+        pin=pin,
+        fid=fid,
+        iclock_machine_id=machine.id if machine else None
+    ))
+
 def handle_user_received(serial_number, adms_user):
-    user = IClockUser.query.filter_by(pin=adms_user['PIN']).first()
+    with timed_phase('db'):
+        machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
+        user = IClockUser.query.filter_by(pin=adms_user['PIN']).first()
+    with timed_phase('log'):
+        if not user:
+            current_app.logger.info(f"Pengguna baru dibuat dengan PIN {adms_user['PIN']}")
+        else:
+            current_app.logger.info(f"Memperbarui pengguna dengan PIN {adms_user['PIN']}")
     if not user:
         user = IClockUser(pin=int(adms_user['PIN']))
-        machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
         if machine:
             user.iclock_machine_id = machine.id
-        app.logger.info(f"Pengguna baru dibuat dengan PIN {adms_user['PIN']}")
-    else:
-        app.logger.info(f"Memperbarui pengguna dengan PIN {adms_user['PIN']}")
     
-    user.name = adms_user['Name']
-    user.primary = adms_user['Pri']
-    user.password = adms_user['Passwd']
-    user.card = adms_user['Card']
-    user.group = adms_user['Grp']
-    user.timezone = adms_user['TZ']
-    user.verify = adms_user['Verify']
-    user.vice_card = adms_user['ViceCard']
-    db.session.add(user)
-    db.session.commit()
+    values = {
+        'name': adms_user['Name'],
+        'primary': adms_user['Pri'],
+        'password': adms_user['Passwd'],
+        'card': adms_user['Card'],
+        'group': adms_user['Grp'],
+        'timezone': adms_user['TZ'],
+        'verify': adms_user['Verify'],
+        'vice_card': adms_user['ViceCard'],
+    }
+    # Hanya perubahan nyata yang direplikasi, sehingga upload ulang dari
+    # mesin yang baru menerima data tidak memicu sinkronisasi berulang
+    changed = user.id is None or any(getattr(user, key) != value for key, value in values.items())
+    for key, value in values.items():
+        setattr(user, key, value)
+    with timed_phase('db'):
+        db.session.add(user)
+        if changed:
+            record_sync_change(SYNC_KIND_USER, user.pin, None, machine)
+        db.session.commit()
 
 def handle_fingerprint_received(serial_number, adms_fingerprint):
-    fingerprint = IClockFingerprint.query.filter_by(pin=adms_fingerprint['PIN'], fid=adms_fingerprint['FID']).first()
+    with timed_phase('db'):
+        machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
+        fingerprint = IClockFingerprint.query.filter_by(pin=adms_fingerprint['PIN'], fid=adms_fingerprint['FID']).first()
+    with timed_phase('log'):
+        if not fingerprint:
+            current_app.logger.info(f"Sidik jari baru dibuat untuk PIN {adms_fingerprint['PIN']}, FID {adms_fingerprint['FID']}")
+        else:
+            current_app.logger.info(f"Memperbarui sidik jari untuk PIN {adms_fingerprint['PIN']}, FID {adms_fingerprint['FID']}")
     if not fingerprint:
         fingerprint = IClockFingerprint(pin=int(adms_fingerprint['PIN']), fid=int(adms_fingerprint['FID']))
-        machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
         if machine:
             fingerprint.iclock_machine_id = machine.id
-        app.logger.info(f"Sidik jari baru dibuat untuk PIN {adms_fingerprint['PIN']}, FID {adms_fingerprint['FID']}")
-    else:
-        app.logger.info(f"Memperbarui sidik jari untuk PIN {adms_fingerprint['PIN']}, FID {adms_fingerprint['FID']}")
     
-    fingerprint.size = int(adms_fingerprint['Size'])
-    fingerprint.valid = adms_fingerprint['Valid']
-    fingerprint.template = adms_fingerprint['TMP']
-    db.session.add(fingerprint)
-    db.session.commit()
+    values = {
+        'size': int(adms_fingerprint['Size']),
+        'valid': adms_fingerprint['Valid'],
+        'template': adms_fingerprint['TMP'],
+    }
+    changed = fingerprint.id is None or any(getattr(fingerprint, key) != value for key, value in values.items())
+    for key, value in values.items():
+        setattr(fingerprint, key, value)
+    with timed_phase('db'):
+        db.session.add(fingerprint)
+        if changed:
+            record_sync_change(SYNC_KIND_FINGERPRINT, fingerprint.pin, fingerprint.fid, machine)
+        db.session.commit()
 
 def handle_attendance_received(serial_number, adms_attendance, machine):
-    iclock_machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
+    with timed_phase('db'):
+        iclock_machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
     attendance_records = []
-    for att in adms_attendance:
-        attendance_date = datetime.strptime(att['date'] + get_timezone_offset_string(machine.timezone), "%Y-%m-%d %H:%M:%S%z")
-        jakarta_date = attendance_date.astimezone(JAKARTA_TZ)
-        attendance = IClockAttendance(
-            pin=int(att['pin']),
-            date=jakarta_date,
-            status=att['status'],
-            verify=att['verify'],
-            work_code=att['workCode'],
-            reserved_1=att['reserved1'],
-            reserved_2=att['reserved2'],
-            iclock_machine_id=iclock_machine.id if iclock_machine else None
-        )
-        attendance_records.append(attendance)
+    with timed_phase('parse'):
+        for att in adms_attendance:
+            jakarta_date = parse_machine_date(att['date'], machine.timezone)
+            attendance = IClockAttendance(
+                pin=int(att['pin']),
+                date=jakarta_date,
+                status=att['status'],
+                verify=att['verify'],
+                work_code=att['workCode'],
+                reserved_1=att['reserved1'],
+                reserved_2=att['reserved2'],
+                iclock_machine_id=iclock_machine.id if iclock_machine else None
+            )
+            attendance_records.append(attendance)
     
-    db.session.bulk_save_objects(attendance_records)
-    db.session.commit()
-    app.logger.info(f"{len(attendance_records)} catatan kehadiran diterima dari mesin {serial_number}")
+    with timed_phase('db'):
+        db.session.bulk_save_objects(attendance_records)
+        db.session.commit()
+    with timed_phase('log'):
+        current_app.logger.info(f"{len(attendance_records)} catatan kehadiran diterima dari mesin {serial_number}")
 
-    # Log detail kehadiran yang diterima
-    for att in attendance_records:
-        app.logger.debug(f"Attendance received: PIN={att.pin}, Date={att.date}, Status={att.status}")
+        # Log detail kehadiran yang diterima
+        for att in attendance_records:
+            current_app.logger.debug(f"Attendance received: PIN={att.pin}, Date={att.date}, Status={att.status}")
 
     # Mengirim data pin ke semua hook yang aktif
-    active_hooks = get_active_hooks()
+    with timed_phase('db'):
+        active_hooks = get_active_hooks()
     machine_name = iclock_machine.name if iclock_machine else "Unknown"  # Ambil nama mesin
-    for hook in active_hooks:
-        try:
-            response = requests.post(hook.url, json=[
-                {
-                    'pin': att['pin'], 
-                    'date': att['date'],
-                    'mesin': machine_name  # Menggunakan nama mesin
-                } for att in adms_attendance
-            ])
-            if response.ok:
-                app.logger.info(f"Data pin berhasil dikirim ke {hook.url}")
-            else:
-                app.logger.error(f"Gagal mengirim data pin ke {hook.url}: {response.status_code}")
-        except requests.RequestException as error:
-            app.logger.error(f"Error saat mengirim data pin ke {hook.url}: {str(error)}")
+    with timed_phase('hooks'):
+        for hook in active_hooks:
+            try:
+                response = requests.post(hook.url, json=[
+                    {
+                        'pin': att['pin'], 
+                        'date': att['date'],
+                        'mesin': machine_name  # Menggunakan nama mesin
+                    } for att in adms_attendance
+                ])
+                if response.ok:
+                    current_app.logger.info(f"Data pin berhasil dikirim ke {hook.url}")
+                else:
+                    current_app.logger.error(f"Gagal mengirim data pin ke {hook.url}: {response.status_code}")
+            except requests.RequestException as error:
+                current_app.logger.error(f"Error saat mengirim data pin ke {hook.url}: {str(error)}")
+
+def handle_oplog_received(serial_number, adms_oplogs, machine):
+    rows = []
+    with timed_phase('parse'):
+        for oplog in adms_oplogs:
+            try:
+                rows.append({
+                    'iclock_machine_id': machine.id,
+                    'date': parse_machine_date(oplog['date'], machine.timezone),
+                    'type': int(oplog['type']),
+                    'status': parse_int(oplog['status']),
+                    'pin': parse_int(oplog['pin']),
+                    'value1': parse_int(oplog['value1']),
+                    'value2': parse_int(oplog['value2']),
+                    'value3': parse_int(oplog['value3']),
+                })
+            except ValueError as e:
+                current_app.logger.warning(f"OPLOG tidak valid dari mesin {serial_number}: {oplog} ({str(e)})")
+
+    if rows:
+        # Satu batch insert per upload
+        with timed_phase('db'):
+            db.session.bulk_insert_mappings(IClockOperationLog, rows)
+            db.session.commit()
+    with timed_phase('log'):
+        current_app.logger.info(f"{len(rows)} catatan OPLOG disimpan dari mesin {serial_number}")
+    return rows
+
+# Replikasi
+# Kode result untuk command yang tidak dijawab atau jawabannya tidak terbaca
+SYNC_RESULT_NO_RESPONSE = -1
+
+def get_machine_sync(machine):
+    sync = db.session.get(IClockMachineSync, machine.id)
+    if not sync:
+        sync = IClockMachineSync(iclock_machine_id=machine.id, acked_version=0)
+        db.session.add(sync)
+    return sync
+
+def sync_key(change):
+    return (change.kind, change.pin, change.fid)
+
+def format_value(value):
+    return '' if value is None else value
+
+def format_user_command(command_id, user):
+    return (
+        f"C:{command_id}:DATA UPDATE USERINFO PIN={user.pin}\tName={format_value(user.name)}"
+        f"\tPri={format_value(user.primary)}\tPasswd={format_value(user.password)}"
+        f"\tCard={format_value(user.card)}\tGrp={format_value(user.group)}"
+        f"\tTZ={format_value(user.timezone)}\tVerify={format_value(user.verify)}"
+        f"\tViceCard={format_value(user.vice_card)}"
+    )
+
+def format_fingerprint_command(command_id, fingerprint):
+    return (
+        f"C:{command_id}:DATA UPDATE FINGERTMP PIN={fingerprint.pin}\tFID={fingerprint.fid}"
+        f"\tSize={format_value(fingerprint.size)}\tValid={format_value(fingerprint.valid)}"
+        f"\tTMP={format_value(fingerprint.template)}"
+    )
+
+def build_sync_commands(machine):
+    """Menyusun batch command DATA UPDATE untuk mesin.
+
+    Batch berisi command yang gagal sebelumnya (maksimal
+    ADMS_SYNC_MAX_ATTEMPTS kali percobaan) ditambah perubahan baru sejak
+    acked_version. Untuk setiap pengguna/sidik jari hanya perubahan terbaru
+    yang dikirim, dan perubahan yang terakhir berasal dari mesin itu sendiri
+    dilewati.
+    """
+    sync = get_machine_sync(machine)
+    now = get_current_jakarta_time().replace(tzinfo=None)
+    resend_after = timedelta(seconds=current_app.config['ADMS_SYNC_RESEND_SECONDS'])
+    max_attempts = current_app.config['ADMS_SYNC_MAX_ATTEMPTS']
+    batch_size = current_app.config['ADMS_SYNC_BATCH_SIZE']
+
+    outstanding = IClockSyncCommand.query.filter_by(iclock_machine_id=machine.id).all()
+    awaiting = [c for c in outstanding if c.result is None]
+    if awaiting:
+        if sync.pending_since and now - sync.pending_since < resend_after:
+            # Batch sebelumnya belum dijawab
+            db.session.commit()
+            return []
+        for command in awaiting:
+            command.result = SYNC_RESULT_NO_RESPONSE
+
+    retries = {c.change_id: c for c in outstanding if c.attempts < max_attempts}
+    retry_changes = IClockSyncChange.query.filter(
+        IClockSyncChange.id.in_(retries)
+    ).order_by(IClockSyncChange.id).all() if retries else []
+
+    head = db.session.query(func.max(IClockSyncChange.id)).scalar() or 0
+    limit = batch_size - len(retry_changes)
+    new_changes = []
+    if limit > 0 and head > sync.acked_version:
+        latest = db.session.query(func.max(IClockSyncChange.id).label('id')).filter(
+            IClockSyncChange.id > sync.acked_version,
+            IClockSyncChange.id <= head
+        ).group_by(
+            IClockSyncChange.kind, IClockSyncChange.pin, IClockSyncChange.fid
+        ).subquery()
+        new_changes = IClockSyncChange.query.join(
+            latest, IClockSyncChange.id == latest.c.id
+        ).filter(
+            or_(IClockSyncChange.iclock_machine_id.is_(None), IClockSyncChange.iclock_machine_id != machine.id)
+        ).order_by(IClockSyncChange.id).limit(limit).all()
+        # Batch tidak penuh berarti semua perubahan sampai head sudah tercakup
+        sync.acked_version = head if len(new_changes) < limit else new_changes[-1].id
+
+    # Command lama (termasuk yang sudah menyerah) untuk data yang kini punya
+    # perubahan lebih baru digantikan oleh perubahan tersebut
+    new_keys = {sync_key(c) for c in new_changes}
+    if new_keys:
+        superseded = IClockSyncChange.query.filter(
+            IClockSyncChange.id.in_([c.change_id for c in outstanding])
+        ).all() if outstanding else []
+        for change in superseded:
+            if sync_key(change) in new_keys:
+                db.session.delete(next(c for c in outstanding if c.change_id == change.id))
+                retries.pop(change.id, None)
+        retry_changes = [c for c in retry_changes if c.id in retries]
+
+    changes = retry_changes + new_changes
+    user_pins = {c.pin for c in changes if c.kind == SYNC_KIND_USER}
+    fingerprint_pins = {c.pin for c in changes if c.kind == SYNC_KIND_FINGERPRINT}
+    users = {u.pin: u for u in IClockUser.query.filter(IClockUser.pin.in_(user_pins))} if user_pins else {}
+    fingerprints = {
+        (f.pin, f.fid): f for f in IClockFingerprint.query.filter(IClockFingerprint.pin.in_(fingerprint_pins))
+    } if fingerprint_pins else {}
+
+    commands = []
+    for change in changes:
+        if change.kind == SYNC_KIND_USER and change.pin in users:
+            commands.append(format_user_command(change.id, users[change.pin]))
+        elif change.kind == SYNC_KIND_FINGERPRINT and (change.pin, change.fid) in fingerprints:
+            commands.append(format_fingerprint_command(change.id, fingerprints[(change.pin, change.fid)]))
+        else:
+            # Data sudah dihapus dari database
+            if change.id in retries:
+                db.session.delete(retries.pop(change.id))
+            continue
+        command = retries.get(change.id)
+        if not command:
+            command = IClockSyncCommand(iclock_machine_id=machine.id, change_id=change.id, attempts=0)
+            db.session.add(command)
+        command.attempts += 1
+        command.result = None
+
+    sync.pending_since = now if commands else None
+    db.session.commit()
+    return commands
+
+def handle_command_results(machine, body):
+    max_attempts = current_app.config['ADMS_SYNC_MAX_ATTEMPTS']
+    with timed_phase('db'):
+        awaiting = {
+            c.change_id: c for c in IClockSyncCommand.query.filter_by(iclock_machine_id=machine.id, result=None)
+        }
+
+    with timed_phase('parse'):
+        results = []
+        for line in body.splitlines():
+            result = {key: values[0] for key, values in parse_qs(line.strip()).items()}
+            if 'ID' in result:
+                results.append((result['ID'], result.get('Return')))
+
+    given_up = []
+    for raw_id, raw_return in results:
+        command_id = parse_int(raw_id)
+        return_code = parse_int(raw_return)
+        if return_code != 0:
+            with timed_phase('log'):
+                current_app.logger.warning(f"Command {raw_id} gagal di mesin {machine.serial_number}: Return={raw_return}")
+        command = awaiting.pop(command_id, None)
+        if not command:
+            continue
+        if return_code == 0:
+            db.session.delete(command)
+        else:
+            command.result = return_code if return_code is not None else SYNC_RESULT_NO_RESPONSE
+            if command.attempts >= max_attempts:
+                given_up.append(command.change_id)
+
+    with timed_phase('db'):
+        if not awaiting:
+            # Semua command sudah dijawab; batch berikutnya (termasuk retry)
+            # boleh dikirim pada polling berikutnya
+            sync = db.session.get(IClockMachineSync, machine.id)
+            if sync:
+                sync.pending_since = None
+        db.session.commit()
+    if given_up:
+        with timed_phase('log'):
+            current_app.logger.error(
+                f"Command {given_up} untuk mesin {machine.serial_number} gagal {max_attempts} kali, tidak dikirim lagi"
+            )
 
 def get_active_hooks():
     return AttendanceHook.query.filter_by(is_active=True).all()
@@ -363,18 +837,18 @@ class CustomRequestHandler(WSGIRequestHandler):
                 print(f"Error logging request: {str(e)}")
 
 # Routes
-@app.route('/iclock/cdata', methods=['GET'])
+@bp.route('/iclock/cdata', methods=['GET'])
 def handshake():
     serial_number = request.args.get('SN')
-    app.logger.info(f"Handshake dimulai untuk SN: {serial_number}")
+    current_app.logger.info(f"Handshake dimulai untuk SN: {serial_number}")
     if not serial_number:
-        app.logger.error("Handshake gagal: Serial number tidak diberikan")
+        current_app.logger.error("Handshake gagal: Serial number tidak diberikan")
         return "ERROR: Serial number tidak diberikan", 400
     
-    app.logger.info(f"Handshake request diterima dari {serial_number}")
+    current_app.logger.info(f"Handshake request diterima dari {serial_number}")
     machine = handle_machine_heartbeat(serial_number)
     if not machine:
-        app.logger.error(f"Gagal memproses mesin dengan SN: {serial_number}")
+        current_app.logger.error(f"Gagal memproses mesin dengan SN: {serial_number}")
         return "ERROR: Gagal memproses mesin", 500
     
     response = [
@@ -392,15 +866,16 @@ def handshake():
         "Realtime=1",
         "Encrypt=None",
     ]
-    app.logger.info(f"Handshake berhasil untuk SN: {serial_number}")
-    app.logger.debug(f"Response: {response}")
+    current_app.logger.info(f"Handshake berhasil untuk SN: {serial_number}")
+    current_app.logger.debug(f"Response: {response}")
     return "\r\n".join(response)
 
-@app.route('/iclock/cdata', methods=['POST'])
+@bp.route('/iclock/cdata', methods=['POST'])
 def receive_data():
     serial_number = request.args.get('SN')
     table = request.args.get('table')
-    body_lines = request.data.decode().strip().split("\n")
+    # Hanya akhir baris yang dibuang; tab di akhir baris adalah field kosong
+    body_lines = [line.rstrip('\r') for line in request.data.decode().split("\n") if line.strip()]
 
     data = {
         'serialNumber': serial_number,
@@ -410,27 +885,32 @@ def receive_data():
     machine = handle_machine_heartbeat(serial_number)
 
     if table == 'ATTLOG':
-        body_data = [line.split("\t") for line in body_lines]
-        att_log = [{
-            'pin': v[0],
-            'date': v[1],
-            'status': v[2],
-            'verify': v[3],
-            'workCode': v[4],
-            'reserved1': v[5],
-            'reserved2': v[6],
-        } for v in body_data]
+        with timed_phase('parse'):
+            body_data = [line.split("\t") for line in body_lines]
+            att_log = [{
+                'pin': v[0],
+                'date': v[1],
+                'status': v[2],
+                'verify': v[3],
+                'workCode': v[4],
+                'reserved1': v[5],
+                'reserved2': v[6],
+            } for v in body_data]
         handle_attendance_received(serial_number, att_log, machine)
         data['data'] = att_log
     elif table == 'OPERLOG':
         operations = []
+        oplogs = []
         for line in body_lines:
-            operation, *rest = line.split(' ')
-            line_data = ' '.join(rest).split("\t")
+            with timed_phase('parse'):
+                operation, *rest = line.split(' ')
+                line_data = ' '.join(rest).split("\t")
             if operation == 'OPLOG':
-                operations.append({
-                    'operation': operation,
-                    'data': {
+                if len(line_data) < 7:
+                    current_app.logger.warning(f"Baris OPLOG tidak lengkap dari mesin {serial_number}: {line}")
+                    continue
+                with timed_phase('parse'):
+                    oplog = {
                         'type': line_data[0],
                         'status': line_data[1],
                         'date': line_data[2],
@@ -439,22 +919,28 @@ def receive_data():
                         'value2': line_data[5],
                         'value3': line_data[6],
                     }
+                oplogs.append(oplog)
+                operations.append({
+                    'operation': operation,
+                    'data': oplog
                 })
             elif operation == 'USER':
-                user_data = {}
-                for item in line_data:
-                    key, value = item.split('=')
-                    user_data[key] = value
+                with timed_phase('parse'):
+                    user_data = {}
+                    for item in line_data:
+                        key, value = item.split('=')
+                        user_data[key] = value
                 handle_user_received(serial_number, user_data)
                 operations.append({
                     'operation': operation,
                     'data': user_data
                 })
             elif operation == 'FP':
-                fp_data = {}
-                for item in line_data:
-                    key, *value = item.split('=')
-                    fp_data[key] = '='.join(value)
+                with timed_phase('parse'):
+                    fp_data = {}
+                    for item in line_data:
+                        key, *value = item.split('=')
+                        fp_data[key] = '='.join(value)
                 handle_fingerprint_received(serial_number, fp_data)
                 operations.append({
                     'operation': operation,
@@ -465,14 +951,19 @@ def receive_data():
                     'operation': operation,
                     'data': line_data
                 })
+        if oplogs and machine:
+            handle_oplog_received(serial_number, oplogs, machine)
         data['data'] = operations
     else:
         data['data'] = body_lines
 
-    app.logger.info(f"Machine Event: {data}")
+    # Detail event hanya di level DEBUG; OPLOG sudah tersimpan di database
+    with timed_phase('log'):
+        current_app.logger.info(f"Machine Event: SN={serial_number}, table={table}, baris={len(body_lines)}")
+        current_app.logger.debug("Machine Event: %s", data)
     return f"OK: {len(body_lines)}"
 
-@app.route('/iclock/getrequest', methods=['GET'])
+@bp.route('/iclock/getrequest', methods=['GET'])
 def send_data():
     serial_number = request.args.get('SN')
     log_data = {
@@ -480,27 +971,41 @@ def send_data():
         'device': serial_number,
         'timestamp': datetime.now(JAKARTA_TZ).strftime('%Y-%m-%d %H:%M:%S')
     }
-    app.logger.info(log_data)
-    handle_machine_heartbeat(serial_number)
+    with timed_phase('log'):
+        current_app.logger.info(log_data)
+    machine = handle_machine_heartbeat(serial_number)
+    commands = []
+    if machine and current_app.config['ADMS_SYNC_ENABLED']:
+        with timed_phase('db'):
+            commands = build_sync_commands(machine)
+    if commands:
+        with timed_phase('log'):
+            current_app.logger.info(f"Mengirim {len(commands)} command sinkronisasi ke mesin {serial_number}")
+        return "\n".join(commands) + "\n"
     return "OK"
 
-@app.route('/iclock/devicecmd', methods=['POST'])
+@bp.route('/iclock/devicecmd', methods=['POST'])
 def status_data():
-    app.logger.info(f"Command Response: {request.args}")
+    with timed_phase('log'):
+        current_app.logger.info(f"Command Response: {request.args}")
+    with timed_phase('db'):
+        machine = IClockMachine.query.filter_by(serial_number=request.args.get('SN')).first()
+    if machine:
+        handle_command_results(machine, request.get_data(as_text=True))
     return "OK"
 
-@app.route('/api/hooks', methods=['GET'])
+@bp.route('/api/hooks', methods=['GET'])
 def get_hooks():
     hooks = AttendanceHook.query.all()
     return jsonify([{'id': h.id, 'url': h.url, 'is_active': h.is_active} for h in hooks])
 
-@app.route('/api/hooks', methods=['POST'])
+@bp.route('/api/hooks', methods=['POST'])
 def add_hook():
     data = request.json
     new_hook = create_hook(data['url'])
     return jsonify({'id': new_hook.id, 'url': new_hook.url, 'is_active': new_hook.is_active}), 201
 
-@app.route('/api/hooks/<int:hook_id>', methods=['PUT'])
+@bp.route('/api/hooks/<int:hook_id>', methods=['PUT'])
 def update_hook_route(hook_id):
     data = request.json
     updated_hook = update_hook(hook_id, data['url'], data['is_active'])
@@ -508,23 +1013,23 @@ def update_hook_route(hook_id):
         return jsonify({'id': updated_hook.id, 'url': updated_hook.url, 'is_active': updated_hook.is_active})
     return jsonify({'error': 'Hook not found'}), 404
 
-@app.route('/api/hooks/<int:hook_id>', methods=['DELETE'])
+@bp.route('/api/hooks/<int:hook_id>', methods=['DELETE'])
 def delete_hook_route(hook_id):
     if delete_hook(hook_id):
         return '', 204
     return jsonify({'error': 'Hook not found'}), 404
 
-@app.route('/webhooks')
+@bp.route('/webhooks')
 def webhooks_page():
     hooks = AttendanceHook.query.all()
     return render_template('webhooks.html', hooks=hooks)
 
-@app.route('/machines')
+@bp.route('/machines')
 def machines_page():
     machines = IClockMachine.query.all()
     return render_template('machines.html', machines=machines)
 
-@app.route('/api/machines/<int:machine_id>', methods=['PUT'])
+@bp.route('/api/machines/<int:machine_id>', methods=['PUT'])
 def update_machine(machine_id):
     try:
         data = request.json
@@ -535,10 +1040,152 @@ def update_machine(machine_id):
             return jsonify({'success': True})
         return jsonify({'success': False, 'error': 'Mesin tidak ditemukan'}), 404
     except Exception as e:
-        app.logger.error(f"Error saat memperbarui nama mesin: {str(e)}")
+        current_app.logger.error(f"Error saat memperbarui nama mesin: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def init_db():
+@bp.route('/api/profiler', methods=['GET'])
+def get_profiler():
+    profiler = current_app.extensions['adms_profiler']
+    status = profiler.to_dict()
+    status['slow_requests'] = list(profiler.slow_requests)
+    return jsonify(status)
+
+@bp.route('/api/profiler', methods=['PUT'])
+def update_profiler():
+    profiler = current_app.extensions['adms_profiler']
+    data = request.json or {}
+
+    # Validasi semua field dulu agar perubahan tidak diterapkan sebagian
+    updates = {}
+    try:
+        if 'sample_rate' in data:
+            updates['sample_rate'] = float(data['sample_rate'])
+            if not 0 <= updates['sample_rate'] <= 1:
+                return jsonify({'error': 'sample_rate harus antara 0 dan 1'}), 400
+        if 'slow_request_ms' in data:
+            updates['slow_request_ms'] = max(float(data['slow_request_ms']), 0)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    if 'enabled' in data:
+        if not isinstance(data['enabled'], bool):
+            return jsonify({'error': 'enabled harus berupa boolean'}), 400
+        updates['enabled'] = data['enabled']
+
+    for key, value in updates.items():
+        setattr(profiler, key, value)
+    current_app.logger.info(f"Pengaturan profiler diperbarui: {profiler.to_dict()}")
+    return jsonify(profiler.to_dict())
+
+@bp.route('/api/profiler', methods=['DELETE'])
+def reset_profiler():
+    current_app.extensions['adms_profiler'].reset()
+    return '', 204
+
+@bp.route('/api/profiler/stats', methods=['GET'])
+def download_profiler_stats():
+    profiler = current_app.extensions['adms_profiler']
+    if request.args.get('format') == 'text':
+        try:
+            report = profiler.format_stats(sort=request.args.get('sort', 'cumulative'))
+        except KeyError as e:
+            return jsonify({'error': f"Kunci sort tidak dikenal: {e}"}), 400
+        if report is None:
+            return jsonify({'error': 'Belum ada data profiling'}), 404
+        return Response(report, mimetype='text/plain')
+
+    data = profiler.dump_pstats()
+    if data is None:
+        return jsonify({'error': 'Belum ada data profiling'}), 404
+    return Response(
+        data,
+        mimetype='application/octet-stream',
+        headers={'Content-Disposition': 'attachment; filename=adms.prof'}
+    )
+
+@bp.route('/api/oplogs', methods=['GET'])
+def get_oplogs():
+    query = IClockOperationLog.query
+    machine_id = request.args.get('machine_id')
+    if machine_id is not None:
+        machine_id = parse_int(machine_id)
+        if machine_id is None:
+            return jsonify({'error': 'machine_id harus berupa angka'}), 400
+    serial_number = request.args.get('SN')
+    if serial_number:
+        machine = IClockMachine.query.filter_by(serial_number=serial_number).first()
+        if not machine:
+            return jsonify({'error': 'Mesin tidak ditemukan'}), 404
+        machine_id = machine.id
+    if machine_id is not None:
+        query = query.filter(IClockOperationLog.iclock_machine_id == machine_id)
+
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        if start:
+            query = query.filter(IClockOperationLog.date >= parse_query_date(start))
+        if end:
+            query = query.filter(IClockOperationLog.date < parse_query_date(end))
+    except ValueError as e:
+        return jsonify({'error': f"Format tanggal tidak valid: {str(e)}"}), 400
+
+    page = query.order_by(IClockOperationLog.date.desc(), IClockOperationLog.id.desc()).paginate(
+        page=request.args.get('page', 1, type=int),
+        per_page=request.args.get('per_page', 100, type=int),
+        max_per_page=1000,
+        error_out=False
+    )
+    return jsonify({
+        'items': [{
+            'id': log.id,
+            'machine_id': log.iclock_machine_id,
+            'date': log.date.isoformat(),
+            'type': log.type,
+            'status': log.status,
+            'pin': log.pin,
+            'value1': log.value1,
+            'value2': log.value2,
+            'value3': log.value3,
+        } for log in page.items],
+        'page': page.page,
+        'per_page': page.per_page,
+        'total': page.total,
+        'pages': page.pages,
+    })
+
+@bp.route('/api/sync', methods=['GET'])
+def get_sync_status():
+    max_attempts = current_app.config['ADMS_SYNC_MAX_ATTEMPTS']
+    head = db.session.query(func.max(IClockSyncChange.id)).scalar() or 0
+    syncs = {s.iclock_machine_id: s for s in IClockMachineSync.query.all()}
+    commands = {}
+    for command in IClockSyncCommand.query.order_by(IClockSyncCommand.change_id):
+        if command.result is None:
+            state = 'pending_commands'
+        elif command.attempts < max_attempts:
+            state = 'retry_commands'
+        else:
+            state = 'failed_commands'
+        commands.setdefault(command.iclock_machine_id, {}).setdefault(state, []).append(command.change_id)
+
+    result = []
+    for machine in IClockMachine.query.all():
+        sync = syncs.get(machine.id)
+        acked_version = sync.acked_version if sync else 0
+        machine_commands = commands.get(machine.id, {})
+        result.append({
+            'machine_id': machine.id,
+            'serial_number': machine.serial_number,
+            'acked_version': acked_version,
+            'pending_since': sync.pending_since.isoformat() if sync and sync.pending_since else None,
+            'pending_commands': machine_commands.get('pending_commands', []),
+            'retry_commands': machine_commands.get('retry_commands', []),
+            'failed_commands': machine_commands.get('failed_commands', []),
+            'lag': head - acked_version,
+        })
+    return jsonify({'head_version': head, 'machines': result})
+
+def init_db(app):
     with app.app_context():
         db.create_all()
 
@@ -548,11 +1195,11 @@ def attempt_connection(max_retries=5, delay=5):
             # Kode untuk melakukan koneksi
             return True  # Jika berhasil
         except ConnectionError:
-            app.logger.warning(f"Koneksi gagal, mencoba lagi dalam {delay} detik...")
+            current_app.logger.warning(f"Koneksi gagal, mencoba lagi dalam {delay} detik...")
             time.sleep(delay)
     return False
 
-def handle_connection(client_socket):
+def handle_connection(app, client_socket):
     try:
         # Baca byte pertama untuk menentukan jenis koneksi
         first_bytes = client_socket.recv(1, socket.MSG_PEEK)
@@ -580,20 +1227,21 @@ def handle_connection(client_socket):
     finally:
         client_socket.close()
 
-def start_server():
+def start_server(app):
+    port = app.config['ADMS_SOCKET_PORT']
     app.logger.info("Server dimulai")
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
-        server_socket.bind(('0.0.0.0', 8082))
+        server_socket.bind(('0.0.0.0', port))
         server_socket.listen(5)
-        app.logger.info("Server mendengarkan di 0.0.0.0:8082")
+        app.logger.info(f"Server mendengarkan di 0.0.0.0:{port}")
         
         while True:
             try:
                 client_socket, addr = server_socket.accept()
                 app.logger.info(f"Koneksi diterima dari {addr}")
-                client_thread = Thread(target=handle_connection, args=(client_socket,))
+                client_thread = Thread(target=handle_connection, args=(app, client_socket))
                 client_thread.daemon = True
                 client_thread.start()
             except Exception as e:
@@ -603,7 +1251,7 @@ def start_server():
     finally:
         server_socket.close()
 
-def send_all_data_to_webhooks():
+def send_all_data_to_webhooks(app):
     with app.app_context():
         app.logger.info("Mengirim semua data ke webhooks")
         active_hooks = get_active_hooks()
@@ -637,23 +1285,56 @@ def send_all_data_to_webhooks():
             except requests.RequestException as error:
                 app.logger.error(f"Error saat mengirim data ke {hook.url}: {str(error)}")
 
+def start_scheduler(app):
+    # Import ditunda: flask_apscheduler cukup berat dan hanya dibutuhkan
+    # jika scheduler diaktifkan
+    from flask_apscheduler import APScheduler
+
+    scheduler = APScheduler()
+    scheduler.init_app(app)
+    scheduler.start()
+    app.extensions['adms_scheduler'] = scheduler
+    return scheduler
+
+def start_background_thread(target, *args):
+    thread = Thread(target=target, args=args)
+    thread.daemon = True
+    thread.start()
+    return thread
+
+def start_background_services(app):
+    """Menjalankan subsistem opsional sesuai konfigurasi app.
+
+    Dipanggil setelah port HTTP terikat, sehingga replay webhook berjalan
+    di latar belakang dan tidak menunda server menerima request.
+    """
+    if app.config['ADMS_ENABLE_SCHEDULER']:
+        start_scheduler(app)
+
+    # Jalankan socket server di thread terpisah
+    if app.config['ADMS_ENABLE_SOCKET_SERVER']:
+        start_background_thread(start_server, app)
+
+    if app.config['ADMS_REPLAY_WEBHOOKS']:
+        start_background_thread(send_all_data_to_webhooks, app)
+
+def run_server(app, host='0.0.0.0', port=8000):
+    # make_server langsung mengikat port, jadi layanan latar belakang baru
+    # dimulai setelah HTTP siap menerima koneksi
+    server = make_server(host, port, app, threaded=True, request_handler=CustomRequestHandler)
+    app.logger.info(f"HTTP server mendengarkan di {host}:{port}")
+    start_background_services(app)
+    server.serve_forever()
+
 if __name__ == '__main__':
-    init_db()
+    app = create_app({
+        'ADMS_ENABLE_LOGGING': True,
+        'ADMS_ENABLE_SCHEDULER': True,
+        'ADMS_ENABLE_SOCKET_SERVER': True,
+        'ADMS_REPLAY_WEBHOOKS': True,
+        'ADMS_LOG_LEVEL': os.getenv('ADMS_LOG_LEVEL', 'INFO'),
+    })
+    init_db(app)
     app.logger.info("Database diinisialisasi")
-    
-    with app.app_context():
-        send_all_data_to_webhooks()
-    
-    # Jalankan socket server di thread terpisah
-    server_thread = Thread(target=start_server)
-    server_thread.daemon = True
-    server_thread.start()
-    
-    # Jalankan Flask app dengan custom request handler
-    app.run(
-        debug=False,  # Set debug ke False untuk menghindari masalah dengan logger
-        use_reloader=False,
-        host='0.0.0.0',
-        port=8000,
-        request_handler=CustomRequestHandler
-    )
+
+    run_server(app)
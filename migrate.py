@@ -1,9 +1,9 @@
-from main import app, db
-from flask import Flask
+from main import create_app, db
 import sqlite3
 import os
 
 def migrate_database():
+    app = create_app()
     with app.app_context():
         try:
             # Cek apakah file database ada
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main  # noqa: E402
+
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', 'app_config(**config): konfigurasi tambahan untuk fixture app')
+
+
+@pytest.fixture
+def app(request):
+    config = {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+    }
+    marker = request.node.get_closest_marker('app_config')
+    if marker:
+        config.update(marker.kwargs)
+    app = main.create_app(config)
+    main.init_db(app)
+    yield app
+    with app.app_context():
+        main.db.session.remove()
+        main.db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
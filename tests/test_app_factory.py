@@ -0,0 +1,30 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_import_and_create_app_have_no_side_effects(tmp_path):
+    # Dijalankan di proses terpisah agar import main benar-benar baru
+    script = textwrap.dedent(f"""
+        import logging
+        import sys
+        import threading
+
+        sys.path.insert(0, {str(ROOT)!r})
+        threads_before = threading.active_count()
+
+        import main
+        app = main.create_app({{'SQLALCHEMY_DATABASE_URI': 'sqlite://'}})
+
+        assert threading.active_count() == threads_before, threading.enumerate()
+        assert 'flask_apscheduler' not in sys.modules
+        assert 'adms_scheduler' not in app.extensions
+        assert not any(isinstance(h, logging.FileHandler) for h in app.logger.handlers)
+    """)
+    result = subprocess.run([sys.executable, '-c', script], cwd=tmp_path, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,60 @@
+import logging
+
+import main
+
+
+def upload_oplogs(client, serial_number, lines):
+    body = '\n'.join(f'OPLOG {line}' for line in lines)
+    return client.post(f'/iclock/cdata?SN={serial_number}&table=OPERLOG', data=body)
+
+
+def test_oplogs_are_stored_and_paginated(client):
+    upload_oplogs(client, 'A', [f'4\t0\t2024-01-01 08:0{i}:00\t{i}\t0\t0\t0' for i in range(5)])
+
+    page = client.get('/api/oplogs?SN=A&per_page=2&page=1').json
+    assert page['total'] == 5
+    assert page['pages'] == 3
+    assert [item['pin'] for item in page['items']] == [4, 3]
+    assert page['items'][0]['type'] == 4
+
+
+def test_trailing_empty_fields_are_kept(client):
+    body = 'OPLOG 4\t0\t2024-01-01 08:00:00\t1\t0\t0\t\r\nOPLOG 4\t0\t2024-01-01 08:01:00\t2\t0\t\t\n'
+    assert client.post('/iclock/cdata?SN=A&table=OPERLOG', data=body).data == b'OK: 2'
+
+    items = client.get('/api/oplogs?SN=A').json['items']
+    assert [(item['pin'], item['value2'], item['value3']) for item in items] == [(2, None, None), (1, 0, None)]
+
+
+def test_machine_id_filter(client):
+    upload_oplogs(client, 'A', ['4\t0\t2024-01-01 08:00:00\t1\t0\t0\t0'])
+    upload_oplogs(client, 'B', ['4\t0\t2024-01-01 08:00:00\t2\t0\t0\t0'])
+
+    assert client.get('/api/oplogs?machine_id=1').json['total'] == 1
+    assert client.get('/api/oplogs?machine_id=x').status_code == 400
+
+
+def test_aware_date_filter_is_converted_to_jakarta_time(client):
+    # DEFAULT_TZ = 7, jadi 10:00 di mesin = 10:00 Jakarta = 03:00 UTC
+    upload_oplogs(client, 'A', ['4\t0\t2024-01-01 10:00:00\t1\t0\t0\t0'])
+
+    assert client.get('/api/oplogs?start=2024-01-01T05:00:00%2B00:00').json['total'] == 0
+    assert client.get('/api/oplogs?start=2024-01-01T02:00:00%2B00:00').json['total'] == 1
+    assert client.get('/api/oplogs?end=2024-01-01T03:00:01%2B00:00').json['total'] == 1
+    assert client.get('/api/oplogs?start=2024-01-01T10:00:00').json['total'] == 1
+
+
+def test_invalid_date_filter_returns_400(client):
+    assert client.get('/api/oplogs?start=bad').status_code == 400
+
+
+def test_configure_logging_uses_configured_level(tmp_path):
+    app = main.create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'ADMS_ENABLE_LOGGING': True,
+        'ADMS_LOG_FILE': str(tmp_path / 'app.log'),
+    })
+    assert app.logger.level == logging.INFO
+    assert all(handler.level == logging.INFO for handler in app.logger.handlers)
+    for handler in app.logger.handlers:
+        handler.close()
@@ -0,0 +1,56 @@
+import time
+
+
+USER_LINE = 'USER PIN=1\tName=a\tPri=0\tPasswd=\tCard=\tGrp=1\tTZ=0\tVerify=0\tViceCard='
+FP_LINE = 'FP PIN=1\tFID=0\tSize=4\tValid=1\tTMP=ab=='
+
+
+def test_enabled_must_be_boolean(client):
+    response = client.put('/api/profiler', json={'enabled': 'false'})
+    assert response.status_code == 400
+    assert client.get('/api/profiler').json['enabled'] is False
+
+    response = client.put('/api/profiler', json={'enabled': True})
+    assert response.status_code == 200
+    assert response.json['enabled'] is True
+
+
+def test_invalid_update_is_not_applied_partially(client):
+    before = client.get('/api/profiler').json
+    response = client.put('/api/profiler', json={'sample_rate': 0.5, 'slow_request_ms': 'abc'})
+    assert response.status_code == 400
+    after = client.get('/api/profiler').json
+    assert after['sample_rate'] == before['sample_rate']
+    assert after['slow_request_ms'] == before['slow_request_ms']
+
+
+def test_operlog_parsing_is_timed_as_parse(client):
+    client.put('/api/profiler', json={'slow_request_ms': 0.0001})
+    client.post('/iclock/cdata?SN=A&table=OPERLOG', data=f'{USER_LINE}\n{FP_LINE}')
+
+    slow = client.get('/api/profiler').json['slow_requests']
+    assert slow[-1]['table'] == 'OPERLOG'
+    assert slow[-1]['phases_ms']['parse'] > 0
+
+
+def test_sampled_request_produces_stats(client):
+    client.put('/api/profiler', json={'enabled': True, 'sample_rate': 1})
+    client.get('/iclock/getrequest?SN=A')
+
+    assert client.get('/api/profiler').json['sampled_requests'] == 1
+    assert client.get('/api/profiler/stats').status_code == 200
+
+
+def test_helper_logging_is_not_counted_as_db(app, client, monkeypatch):
+    def slow_info(*args, **kwargs):
+        time.sleep(0.05)
+
+    client.put('/api/profiler', json={'slow_request_ms': 0.0001})
+    monkeypatch.setattr(app.logger, 'info', slow_info)
+    users = '\n'.join(USER_LINE.replace('PIN=1', f'PIN={pin}') for pin in range(1, 4))
+    client.post('/iclock/cdata?SN=A&table=OPERLOG', data=users)
+
+    phases = client.get('/api/profiler').json['slow_requests'][-1]['phases_ms']
+    # Heartbeat, 3 pengguna dan ringkasan upload masing-masing menulis INFO
+    assert phases['log'] >= 250
+    assert phases['db'] < 250
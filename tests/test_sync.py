@@ -0,0 +1,161 @@
+import pytest
+
+
+pytestmark = pytest.mark.app_config(ADMS_SYNC_BATCH_SIZE=2)
+
+
+def user_line(pin, name):
+    return f'USER PIN={pin}\tName={name}\tPri=0\tPasswd=\tCard=\tGrp=1\tTZ=0\tVerify=0\tViceCard='
+
+
+def upload_users(client, serial_number, users):
+    body = '\n'.join(user_line(pin, name) for pin, name in users)
+    client.post(f'/iclock/cdata?SN={serial_number}&table=OPERLOG', data=body)
+
+
+def poll(client, serial_number):
+    body = client.get(f'/iclock/getrequest?SN={serial_number}').data.decode()
+    return [] if body == 'OK' else body.splitlines()
+
+
+def command_ids(commands):
+    return [int(command.split(':')[1]) for command in commands]
+
+
+def report(client, serial_number, results):
+    body = '\n'.join(f'ID={command_id}&Return={code}&CMD=DATA' for command_id, code in results)
+    client.post(f'/iclock/devicecmd?SN={serial_number}', data=body)
+
+
+def sync_status(client, serial_number):
+    machines = client.get('/api/sync').json['machines']
+    return next(m for m in machines if m['serial_number'] == serial_number)
+
+
+@pytest.fixture
+def machines(client):
+    for serial_number in ('A', 'B'):
+        client.get(f'/iclock/cdata?SN={serial_number}')
+
+
+def test_own_changes_are_skipped(client, machines):
+    upload_users(client, 'A', [(1, 'a'), (2, 'b')])
+
+    assert poll(client, 'A') == []
+    assert sync_status(client, 'A')['acked_version'] == 2
+    assert sync_status(client, 'A')['lag'] == 0
+
+
+def test_latest_change_wins_over_own_older_change(client, machines):
+    upload_users(client, 'A', [(1, 'a')])
+    upload_users(client, 'B', [(1, 'b')])
+
+    commands = poll(client, 'A')
+    assert len(commands) == 1
+    assert 'PIN=1\tName=b' in commands[0]
+    assert poll(client, 'B') == []
+
+
+def test_unchanged_upload_does_not_create_change(client, machines):
+    upload_users(client, 'A', [(1, 'a')])
+    upload_users(client, 'B', [(1, 'a')])
+
+    assert client.get('/api/sync').json['head_version'] == 1
+
+
+def test_full_batch_boundary(client, machines):
+    upload_users(client, 'A', [(1, 'a'), (2, 'b')])
+
+    commands = poll(client, 'B')
+    assert command_ids(commands) == [1, 2]
+    assert sync_status(client, 'B')['pending_commands'] == [1, 2]
+    assert poll(client, 'B') == []
+
+    report(client, 'B', [(1, 0), (2, 0)])
+    status = sync_status(client, 'B')
+    assert status['acked_version'] == 2
+    assert status['pending_commands'] == []
+    assert status['lag'] == 0
+    assert poll(client, 'B') == []
+
+
+def test_changes_beyond_batch_size_are_sent_in_next_batch(client, machines):
+    upload_users(client, 'A', [(1, 'a'), (2, 'b'), (3, 'c')])
+
+    assert command_ids(poll(client, 'B')) == [1, 2]
+    assert poll(client, 'B') == []
+    report(client, 'B', [(1, 0), (2, 0)])
+    assert sync_status(client, 'B')['acked_version'] == 2
+
+    assert command_ids(poll(client, 'B')) == [3]
+    report(client, 'B', [(3, 0)])
+    assert sync_status(client, 'B')['lag'] == 0
+
+
+def test_partial_results_keep_batch_pending(client, machines):
+    upload_users(client, 'A', [(1, 'a'), (2, 'b')])
+    poll(client, 'B')
+
+    report(client, 'B', [(2, 0)])
+    assert sync_status(client, 'B')['pending_commands'] == [1]
+    assert poll(client, 'B') == []
+
+
+def test_unanswered_command_is_resent_after_timeout(app, client, machines):
+    upload_users(client, 'A', [(1, 'a'), (2, 'b')])
+    poll(client, 'B')
+    report(client, 'B', [(2, 0)])
+
+    app.config['ADMS_SYNC_RESEND_SECONDS'] = 0
+    assert command_ids(poll(client, 'B')) == [1]
+
+
+def test_only_failed_commands_are_retried(client, machines):
+    upload_users(client, 'A', [(1, 'a'), (2, 'b')])
+    poll(client, 'B')
+
+    report(client, 'B', [(1, 0), (2, -1001)])
+    status = sync_status(client, 'B')
+    assert status['acked_version'] == 2
+    assert status['retry_commands'] == [2]
+
+    # Retry dikirim bersama perubahan baru, bukan seluruh batch lama
+    upload_users(client, 'A', [(3, 'c')])
+    assert command_ids(poll(client, 'B')) == [2, 3]
+    report(client, 'B', [(2, 0), (3, 0)])
+
+    status = sync_status(client, 'B')
+    assert status['retry_commands'] == []
+    assert status['acked_version'] == 3
+    assert status['lag'] == 0
+
+
+def test_command_is_given_up_after_max_attempts(client, machines):
+    upload_users(client, 'A', [(1, 'a'), (2, 'b')])
+
+    poll(client, 'B')
+    report(client, 'B', [(1, 0), (2, -1001)])
+    for _ in range(2):
+        assert command_ids(poll(client, 'B')) == [2]
+        report(client, 'B', [(2, -1001)])
+
+    status = sync_status(client, 'B')
+    assert status['failed_commands'] == [2]
+    assert status['retry_commands'] == []
+    assert poll(client, 'B') == []
+
+    # Perubahan baru tidak tertahan oleh command yang gagal
+    upload_users(client, 'A', [(3, 'c')])
+    assert command_ids(poll(client, 'B')) == [3]
+
+
+def test_new_change_replaces_failed_command(client, machines):
+    upload_users(client, 'A', [(1, 'a')])
+    poll(client, 'B')
+    report(client, 'B', [(1, -1001)])
+
+    upload_users(client, 'A', [(1, 'aa')])
+    commands = poll(client, 'B')
+    assert command_ids(commands) == [2]
+    assert 'Name=aa' in commands[0]
+    assert sync_status(client, 'B')['retry_commands'] == []